@@ -1,4 +1,4 @@
-import toml
+import tomllib
 from pathlib import Path
 from app.database.db import get_db, check_db_exists
 from app.database.stores import get_stores_count
@@ -24,7 +24,8 @@ async def migrate_from_toml() -> dict:
         }
 
     try:
-        config = toml.load(toml_path)
+        with open(toml_path, "rb") as f:
+            config = tomllib.load(f)
     except Exception as e:
         return {
             "imported": 0,
@@ -1,4 +1,4 @@
-import toml
+import tomllib
 from typing import Optional, List, Dict, Any
 from app.database.db import get_db
 from app.database.crypto import encrypt_token, decrypt_token
@@ -138,7 +138,8 @@ async def import_from_toml() -> Dict[str, int]:
     toml_path = "config_stores.toml"
 
     try:
-        config = toml.load(toml_path)
+        with open(toml_path, "rb") as f:
+            config = tomllib.load(f)
     except FileNotFoundError:
         return {"imported": 0, "skipped": 0, "error": "config_stores.toml not found"}
     except Exception as e:
@@ -1,8 +1,9 @@
 from app.utilities.shopify import (
-    add_to_sale_channels, 
+    activate_inventory_operation,
     adjust_quantity_to_variant, 
     get_product_variants_by_identifier, 
-    set_activate_quantity_on_location,
+    sale_channels_operation,
+    shopify_batch_execute,
     detect_identifier_type,
     set_fixed_quantity_to_variant
 )
@@ -105,7 +106,10 @@ def get_product_variants_and_sync(
     print(f"DEBUG: Unique references: {len(set(prod_reference))}")
     logger.info(f"Using {identifier_type} for product search")
     
-    product_variants = get_product_variants_by_identifier(prod_reference, identifier_type, store_id=store_id)
+    # The sync only reads the identifier, the product id and the inventory item id
+    product_variants = get_product_variants_by_identifier(
+        prod_reference, identifier_type, store_id=store_id, fields={"product", "inventoryItem"}
+    )
     
     print(f"DEBUG: Found {len(product_variants) if product_variants else 0} variants from Shopify")
     logger.info(f"Found {len(product_variants) if product_variants else 0} variants from Shopify")
@@ -133,6 +137,9 @@ def get_product_variants_and_sync(
     logger.log_duplicate_items(duplicate_rows)
     
     inventories = []
+    # Sale-channel and inventory-activation mutations, sent in batches after the loop
+    setup_operations = []
+    published_products = set()
     result = None
     
     # Process each row and match with variants efficiently
@@ -187,12 +194,15 @@ def get_product_variants_and_sync(
             # Only execute Shopify operations if no variants are missing
             if not missing_rows and not duplicate_rows:
                 if publications:
-                    add_to_sale_channels(
-                        resource_id=variant["product"]["id"],
-                        channels=publications,
-                        store_id=store_id
-                    )
-                set_activate_quantity_on_location(inventoryItemId=inventory_item, locationId=location_id_full, store_id=store_id)
+                    # Variants of the same product share one publish operation
+                    publish_key = (variant["product"]["id"], tuple(p["publicationId"] for p in publications))
+                    if publish_key not in published_products:
+                        published_products.add(publish_key)
+                        setup_operations.append(sale_channels_operation(
+                            resource_id=variant["product"]["id"],
+                            channels=publications
+                        ))
+                setup_operations.append(activate_inventory_operation(inventoryItemId=inventory_item, locationId=location_id_full))
                 
                 # Build inventory update based on sync_mode
                 if sync_mode == "adjust":
@@ -218,6 +228,14 @@ def get_product_variants_and_sync(
                     })
         
 
+    # Publish products and activate inventory at their locations before touching quantities
+    if setup_operations:
+        print(f"DEBUG: Running {len(setup_operations)} sale channel/activation operations in batches")
+        setup_results = shopify_batch_execute(setup_operations, store_id=store_id)
+        failed_setups = sum(1 for r in setup_results if r.get("error") or r.get("errors"))
+        if failed_setups:
+            logger.warning(f"{failed_setups} of {len(setup_operations)} sale channel/activation operations failed")
+
     # Only adjust quantities if no variants are missing
     if not missing_rows and not duplicate_rows and inventories:
         print(f"DEBUG: Updating quantities for {len(inventories)} inventory items using mode: {sync_mode}")
@@ -228,7 +246,11 @@ def get_product_variants_and_sync(
                 # Use delta-based adjustment
                 logger.info("Executing adjust sync mode (delta-based)")
                 result = adjust_quantity_to_variant(inventories=inventories, store_id=store_id)
-                logger.success(f"Successfully adjusted quantities for {len(inventories)} items")
+                if result and "error" in result:
+                    # Batches sent before the failure still landed; their changes are saved below
+                    logger.warning(f"Adjustment failed after Shopify applied batches {result.get('applied_batches', [])}")
+                else:
+                    logger.success(f"Successfully adjusted quantities for {len(inventories)} items")
             elif sync_mode == "replace":
                 # Set to exact quantities
                 logger.info("Executing replace sync mode (exact quantities)")
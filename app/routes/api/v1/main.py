@@ -439,7 +439,8 @@ async def check_file_structure(
         # Auto-detect based on content if SKU field is present
         identifier_type = detect_identifier_type(prod_reference)
         
-        product_variants = get_product_variants_by_identifier(prod_reference, identifier_type, store_id=store_id)
+        # Only the identifier itself is needed to tell found rows from missing ones
+        product_variants = get_product_variants_by_identifier(prod_reference, identifier_type, store_id=store_id, fields=set())
         if not product_variants:
             print("DEBUG: No variants found, returning early")
             return {
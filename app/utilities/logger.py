@@ -1,9 +1,62 @@
+import csv
 import logging
 import os
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Union
+
+from app.utilities.shopify import strip_gid
+
+# Number of change-parsing errors logged with a full traceback per sync
+MAX_LOGGED_PARSE_ERRORS = 3
+
+# Column order of the quantity_changes_*.csv export
+CHANGE_LOG_FIELDS = [
+    "timestamp",
+    "sync_mode",
+    "product_id",
+    "product_handle",
+    "variant_display",
+    "location_id",
+    "location_name",
+    "delta",
+    "final_quantity",
+    "available_for_sale",
+]
+
+
+# Write buffer of the sync log files; records below WARNING stay buffered
+LOG_BUFFER_SIZE = 1 << 16
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    File handler that writes through a 64 KiB buffer.
+    Only WARNING and above force a flush; everything else is written out when
+    the buffer fills, on an explicit flush, or when logging shuts down at exit.
+    """
+
+    def _open(self):
+        return open(
+            self.baseFilename,
+            self.mode,
+            buffering=LOG_BUFFER_SIZE,
+            encoding=self.encoding,
+            errors=self.errors,
+        )
+
+    def emit(self, record: logging.LogRecord):
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.WARNING:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
 
 
 class SyncLogger:
@@ -47,7 +100,7 @@ class SyncLogger:
         # Avoid adding handlers if they already exist
         if not logger.handlers:
             # Create file handler
-            file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+            file_handler = BufferedFileHandler(log_filename, encoding='utf-8')
             file_handler.setLevel(logging.DEBUG)
             
             # Create formatter
@@ -101,24 +154,35 @@ class SyncLogger:
         self.info(f"Duplicate items: {duplicate_count}")
         self.info(f"Quantity changes applied: {changes_count}")
         self.info("=" * 50)
+        # The summary closes the sync: make the buffered log readable right away
+        self.flush()
     
-    def log_missing_items(self, missing_items: List[str]):
-        """Log missing items."""
-        if missing_items:
-            self.warning(f"Found {len(missing_items)} missing items:")
-            for item in missing_items[:20]:  # Log first 20
+    def flush(self):
+        """Flush buffered records of all handlers to disk."""
+        for handler in self.logger.handlers:
+            handler.flush()
+    
+    def _log_item_block(self, label: str, items: Union[pd.Series, List[str]], limit: int = 20):
+        """Log the count and the first `limit` entries of a list or Series of items."""
+        if len(items) == 0:
+            return
+        self.warning(f"Found {len(items)} {label} items:")
+        if isinstance(items, pd.Series):
+            # Format the whole preview in one block instead of one record per item
+            self.warning(items.head(limit).to_string(index=False, header=False))
+        else:
+            for item in items[:limit]:
                 self.warning(f"  - {item}")
-            if len(missing_items) > 20:
-                self.warning(f"  ... and {len(missing_items) - 20} more")
+        if len(items) > limit:
+            self.warning(f"  ... and {len(items) - limit} more")
+
+    def log_missing_items(self, missing_items: Union[pd.Series, List[str]]):
+        """Log missing items."""
+        self._log_item_block("missing", missing_items)
     
-    def log_duplicate_items(self, duplicate_items: List[str]):
+    def log_duplicate_items(self, duplicate_items: Union[pd.Series, List[str]]):
         """Log duplicate items."""
-        if duplicate_items:
-            self.warning(f"Found {len(duplicate_items)} duplicate items:")
-            for item in duplicate_items[:20]:  # Log first 20
-                self.warning(f"  - {item}")
-            if len(duplicate_items) > 20:
-                self.warning(f"  ... and {len(duplicate_items) - 20} more")
+        self._log_item_block("duplicate", duplicate_items)
     
     def parse_and_save_changes(self, result: Optional[Dict], sync_mode: str) -> Optional[str]:
         """
@@ -135,10 +199,12 @@ class SyncLogger:
             self.warning("No result data to parse")
             return None
         
-        # Handle error in result
+        # Handle error in result; a partially applied result still carries the
+        # changes of the batches Shopify applied, so those are saved
         if "error" in result:
             self.error(f"Result contains error: {result['error']}")
-            return None
+            if not result.get("applied_batches"):
+                return None
         
         # Extract changes from the result structure
         changes = None
@@ -154,8 +220,9 @@ class SyncLogger:
         
         self.info(f"Parsing {len(changes)} quantity changes")
         
-        # Parse changes into a list of dictionaries for DataFrame
+        # Parse changes into a list of dictionaries for the CSV writer
         parsed_changes = []
+        parse_errors = 0
         for change in changes:
             try:
                 # Extract variant information
@@ -166,11 +233,11 @@ class SyncLogger:
                 
                 # Extract location name and ID
                 location_name = location.get("name", "Unknown")
-                location_id = location.get("id", "").replace("gid://shopify/Location/", "")
+                location_id = strip_gid(location.get("id", ""))
                 
                 # Extract product info
                 product_handle = product.get("handle", "Unknown")
-                product_id = product.get("id", "").replace("gid://shopify/Product/", "")
+                product_id = strip_gid(product.get("id", ""))
                 variant_display = variant.get("displayName", "Unknown")
                 
                 # Extract quantity change
@@ -189,7 +256,6 @@ class SyncLogger:
                                 break
                 
                 parsed_changes.append({
-                    "timestamp": self.timestamp,
                     "sync_mode": sync_mode,
                     "product_id": product_id,
                     "product_handle": product_handle,
@@ -202,27 +268,35 @@ class SyncLogger:
                 })
                 
             except Exception as e:
-                self.error(f"Error parsing change: {str(e)}", exc_info=True)
+                # A systematically malformed field fails on every row; only the
+                # first few tracebacks are worth formatting
+                parse_errors += 1
+                if parse_errors <= MAX_LOGGED_PARSE_ERRORS:
+                    self.error(f"Error parsing change: {str(e)}", exc_info=True)
                 continue
         
+        if parse_errors > MAX_LOGGED_PARSE_ERRORS:
+            self.warning(f"Suppressed {parse_errors - MAX_LOGGED_PARSE_ERRORS} further parse errors")
+        
         if not parsed_changes:
             self.warning("No changes could be parsed")
             return None
         
-        # Create DataFrame
-        df = pd.DataFrame(parsed_changes)
-        
-        # Save to CSV with date-based filename
+        # Save to CSV with date-based filename. The timestamp column is the same
+        # for every row, so it is added as each row is written
         csv_filename = self.store_log_dir / f"quantity_changes_{self.timestamp}.csv"
-        df.to_csv(csv_filename, index=False, encoding='utf-8')
+        with open(csv_filename, "w", newline="", encoding="utf-8", buffering=1 << 16) as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=CHANGE_LOG_FIELDS)
+            writer.writeheader()
+            writer.writerows({"timestamp": self.timestamp, **row} for row in parsed_changes)
         
         self.success(f"Saved {len(parsed_changes)} quantity changes to: {csv_filename}")
         
         # Log some statistics
-        total_delta = df["delta"].sum() if "delta" in df.columns else 0
+        total_delta = sum(row["delta"] or 0 for row in parsed_changes)
         self.info(f"Total quantity change: {total_delta}")
-        self.info(f"Unique products affected: {df['product_id'].nunique()}")
-        self.info(f"Unique locations affected: {df['location_id'].nunique()}")
+        self.info(f"Unique products affected: {len({row['product_id'] for row in parsed_changes})}")
+        self.info(f"Unique locations affected: {len({row['location_id'] for row in parsed_changes})}")
         
         return str(csv_filename)
     
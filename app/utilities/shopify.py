@@ -1,18 +1,263 @@
 import os
-import shopify
-import json
+import queue
 import asyncio
-import toml
+import aiohttp
+import atexit
+import contextlib
+import functools
+import logging
+import numpy as np
+import re
+import requests
+import threading
+import time
+import tomllib
+from collections.abc import AsyncIterator, Callable, Iterator
 from pathlib import Path
-from datetime import datetime
-from shopify.base import ShopifyConnection
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 """
 RESOURCE -> https://github.com/Shopify/shopify_python_api
 """
 
+logger = logging.getLogger(__name__)
+
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
+# Maximum number of GraphQL requests in flight at once on the async path
+GRAPHQL_CONCURRENCY = 4
+
+# Keep-alive HTTP session shared by every synchronous GraphQL call, so TCP and
+# TLS handshakes are paid once per host instead of once per request.
+# Only throttled (429) responses and failed connections are retried: Shopify
+# did not execute those, whereas retrying a 5xx or a read timeout on an
+# inventory mutation could apply it twice.
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        read=False,
+        backoff_factor=0.2,
+        status_forcelist=[429],
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    ),
+))
+
+# Maximum number of aliased mutations sent in one shopify_batch_execute request
+MUTATION_BATCH_SIZE = 25
+
+# Pieces of a single-field "mutation Name($var: Type) { field(...) { ... } }" document
+_MUTATION_DOCUMENT = re.compile(
+    r"^\s*(?:#gql\s*)?mutation\s+\w+\s*(?:\((?P<definitions>[^)]*)\))?\s*\{(?P<body>.*)\}\s*$",
+    re.S,
+)
+_ROOT_FIELD = re.compile(r"(\w+)")
+_VARIABLE_TOKEN = re.compile(r"\$(\w+)")
+
+# OR-joined searches sent as aliases of one GraphQL request. Each gets a
+# 1/N share of the 250-node page, so the request costs the same as one page
+VARIANT_SEARCHES_PER_REQUEST = 4
+
+# Identifier lists longer than this are matched against a bulk export of all
+# variants (one background job streamed as NDJSON) instead of searched page by page.
+# The export walks the whole catalog, so it only pays off for very large lists.
+BULK_QUERY_THRESHOLD = 20000
+# Seconds between status checks of a running bulk operation
+BULK_POLL_INTERVAL = 2
+
+# Search terms OR-joined into one search query. Longer query strings run into
+# Shopify's search parse limits and cost more per page, so larger identifier
+# lists are split into several queries that run concurrently instead
+_MAX_CLAUSES_PER_QUERY = 32
+# Upper bound on the characters of one search string, so batches of long
+# identifiers stay under Shopify's query-string limit as well
+_MAX_QUERY_LENGTH = 4000
+
+# Root field of each mutation operation; its payload carries the userErrors.
+# Queries never do, so their responses skip the check; add new mutations here
+_OP_TO_ROOT = {
+    "ActivateInventoryItem": "inventoryActivate",
+    "inventoryAdjustQuantities": "inventoryAdjustQuantities",
+    "InventorySet": "inventorySetQuantities",
+    "SetObjectToSaleChannel": "publishablePublish",
+    "BulkVariantsRun": "bulkOperationRunQuery",
+}
+
+# Requests rejected with a THROTTLED error are retried this many times
+THROTTLE_RETRIES = 3
+
+# Environment fallback credentials, resolved once at import
+_ENV_ACCESS_TOKEN = os.environ.get("ACCESS_TOKEN")
+_ENV_STORE_NAME = os.environ.get("STORE_NAME")
+_ENV_API_VERSION = os.environ.get("API_VERSION", "2025-10")
+_ENV_CREDENTIALS = {
+    "access_token": _ENV_ACCESS_TOKEN,
+    "base_url": f"{_ENV_STORE_NAME}.myshopify.com",
+    "api_version": _ENV_API_VERSION
+} if _ENV_ACCESS_TOKEN and _ENV_STORE_NAME else None
+
+# Credentials of every store in config_stores.toml, resolved in one go and
+# rebuilt only when the file changes: (toml mtime, {store_id: credentials})
+_CONFIG_CREDENTIALS: tuple[float, dict[str, dict]] | None = None
+
+# Event loop shared by the synchronous entry points, running in a daemon thread,
+# and the aiohttp session living on it: connections stay open between calls
+HTTP_POOL_SIZE = 32
+_LOOP: asyncio.AbstractEventLoop | None = None
+_LOOP_LOCK = threading.Lock()
+_HTTP_CLIENT: aiohttp.ClientSession | None = None
+
+# Resolved credentials are reused for this many seconds, so a token rotated in
+# the database or config is picked up without restarting the process
+CREDENTIALS_CACHE_TTL = 300
+# Resolved credentials per store_id: (expiry, credentials)
+_CREDENTIALS_CACHE: dict[str | None, tuple[float, dict]] = {}
+_CREDENTIALS_LOCK = threading.Lock()
+
+class _CostThrottle:
+    """
+    Client-side mirror of Shopify's GraphQL leaky bucket, per store.
+    Every response reports extensions.cost.throttleStatus (points currently
+    available, bucket size, restore rate) and the requestedQueryCost of the
+    operation. Before sending, callers reserve the operation's last known cost
+    and wait until the bucket has refilled enough to pay for it, so concurrent
+    workers pace themselves instead of being rejected as THROTTLED.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # scope -> [available, maximum, restore_rate, updated_at]
+        self._buckets: dict[str, list[float]] = {}
+        # operation_name -> last requestedQueryCost
+        self._costs: dict[str | None, float] = {}
+
+    def reserve(self, scope: str, operation_name: str | None) -> float:
+        """Reserve the expected cost of an operation; return the seconds to wait before sending it."""
+        with self._lock:
+            bucket = self._buckets.get(scope)
+            cost = self._costs.get(operation_name)
+            if bucket is None or cost is None:
+                return 0.0  # Nothing known yet: the first response will tell
+            available, maximum, restore_rate, updated_at = bucket
+            now = time.monotonic()
+            available = min(maximum, available + (now - updated_at) * restore_rate) - cost
+            self._buckets[scope] = [available, maximum, restore_rate, now]
+            if available >= 0 or restore_rate <= 0:
+                return 0.0
+            return -available / restore_rate
+
+    def update(self, scope: str, operation_name: str | None, extensions: dict | None):
+        """Record the bucket state and operation cost reported by a response."""
+        cost = (extensions or {}).get("cost")
+        if not cost:
+            return
+        status = cost.get("throttleStatus") or {}
+        with self._lock:
+            if cost.get("requestedQueryCost") is not None:
+                self._costs[operation_name] = cost["requestedQueryCost"]
+            if status:
+                self._buckets[scope] = [
+                    status.get("currentlyAvailable", 0),
+                    status.get("maximumAvailable", 0),
+                    status.get("restoreRate", 0),
+                    time.monotonic(),
+                ]
+
+    def retry_delay(self, scope: str, operation_name: str | None) -> float:
+        """Seconds until the bucket can pay for an operation that was rejected as THROTTLED."""
+        with self._lock:
+            bucket = self._buckets.get(scope)
+            cost = self._costs.get(operation_name, 0)
+        if not bucket or bucket[2] <= 0:
+            return 1.0
+        return max(cost - bucket[0], 0) / bucket[2] or 1.0
+
+
+_THROTTLE = _CostThrottle()
+
+def _is_throttled(res: dict) -> bool:
+    """True if Shopify rejected the request because the cost bucket was empty."""
+    errors = res.get("errors")
+    if not isinstance(errors, list):
+        return False
+    return any(
+        isinstance(error, dict) and (error.get("extensions") or {}).get("code") == "THROTTLED"
+        for error in errors
+    )
+
+# Lexical pieces of a GraphQL document: string literals, comments, whitespace runs and the rest
+_GQL_TOKEN = re.compile(r'"(?:[^"\\\n]|\\.)*"|#[^\n]*|\s+|[^\s"#]+')
+
+def _minify_gql(document: str) -> str:
+    """
+        Strip comments and insignificant whitespace from a GraphQL document, so the
+        indented documents kept in this module are sent as compact request bodies.
+        A space is only kept where it separates two names or numbers.
+    """
+    parts = []
+    separated = False
+    for token in _GQL_TOKEN.findall(document):
+        if token[0] == "#" or token.isspace():
+            separated = True
+            continue
+        if separated and parts and (parts[-1][-1].isalnum() or parts[-1][-1] == "_") \
+                and (token[0].isalnum() or token[0] == "_"):
+            parts.append(" ")
+        parts.append(token)
+        separated = False
+    return "".join(parts)
+
+# Minified contents of <operation_name>.graphql files, read once per process
+_GQL_DOCS: dict[str, str] = {}
+
+def _load_gql(operation_name: str) -> str:
+    """Return the document of <operation_name>.graphql, reading the file only on first use."""
+    document = _GQL_DOCS.get(operation_name)
+    if document is None:
+        document = _GQL_DOCS.setdefault(operation_name, _minify_gql(Path(f"{operation_name}.graphql").read_text()))
+    return document
+
+def _load_store_config() -> dict:
+    """Load config_stores.toml from the project root."""
+    with open(PROJECT_ROOT / "config_stores.toml", "rb") as f:
+        return tomllib.load(f)
+
+def _config_credentials() -> dict[str, dict]:
+    """Credentials of every store in the config file, keyed by store_id."""
+    global _CONFIG_CREDENTIALS
+
+    mtime = (PROJECT_ROOT / "config_stores.toml").stat().st_mtime
+    if _CONFIG_CREDENTIALS is None or _CONFIG_CREDENTIALS[0] != mtime:
+        stores = _load_store_config().get("stores", {})
+        _CONFIG_CREDENTIALS = (mtime, {
+            store_id: {
+                "access_token": store_config.get("ACCESS_TOKEN"),
+                "base_url": f"{store_config.get('STORE_NAME')}.myshopify.com",
+                "api_version": store_config.get("API_VERSION", "2025-10")
+            }
+            for store_id, store_config in stores.items()
+        })
+    return _CONFIG_CREDENTIALS[1]
+
 def get_store_credentials(store_id: str = None) -> dict:
     """
     Get store credentials from SQLite DB based on store_id.
@@ -21,7 +266,7 @@ def get_store_credentials(store_id: str = None) -> dict:
     if store_id:
         try:
             from app.database import get_store_credentials as db_get_credentials
-            creds = asyncio.run(db_get_credentials(store_id))
+            creds = _run_loop(db_get_credentials(store_id))
             if creds:
                 return {
                     "access_token": creds.get("ACCESS_TOKEN"),
@@ -29,69 +274,46 @@ def get_store_credentials(store_id: str = None) -> dict:
                     "api_version": creds.get("API_VERSION", "2025-10")
                 }
         except Exception as e:
-            print(f"DEBUG: DB not available, falling back to TOML: {e}")
+            logger.debug("DB not available, falling back to TOML: %s", e)
 
-    try:
-        config = toml.load(PROJECT_ROOT / "config_stores.toml")
-        if store_id:
-            stores = config.get("stores", {})
-            if store_id in stores:
-                store_config = stores[store_id]
-                return {
-                    "access_token": store_config.get("ACCESS_TOKEN"),
-                    "base_url": f"{store_config.get('STORE_NAME')}.myshopify.com",
-                    "api_version": store_config.get("API_VERSION", "2025-10")
-                }
-    except Exception as e:
-        print(f"DEBUG: TOML not available: {e}")
-
-    access_token = os.environ.get("ACCESS_TOKEN")
-    store_name = os.environ.get("STORE_NAME")
-    if access_token and store_name:
-        return {
-            "access_token": access_token,
-            "base_url": f"{store_name}.myshopify.com",
-            "api_version": os.environ.get("API_VERSION", "2025-10")
-        }
-    
-    return None
+    if store_id:
+        try:
+            credentials = _config_credentials().get(store_id)
+            if credentials:
+                return credentials
+        except Exception as e:
+            logger.debug("TOML not available: %s", e)
 
-def shopify_connection(credentials: dict = None, store_id: str = None) -> tuple[shopify.Session | None, float]:
+    return _ENV_CREDENTIALS
+
+def get_cached_store_credentials(store_id: str = None) -> dict | None:
     """
-        Connect to Shopify API using the provided credentials.
-        :param credentials: dict: The credentials for the Shopify API.
-        :param store_id: str: The store ID from config (e.g., 'murphy', 'refrigiwear')
-        :return:
-            - shopify session: The Shopify API client.
-            - float: The time taken to establish the connection.
+    Same as get_store_credentials, but memoized per store_id for
+    CREDENTIALS_CACHE_TTL seconds. Failed lookups are not cached.
     """
-    if credentials:    
-        # Extract credentials from the dictionary
-        access_token = credentials["access_token"] if "access_token" in credentials else None
-        base_url = credentials["base_url"] if "base_url" in credentials else None
-        api_version = credentials.get("api_version", "2025-04")
-    else:
-        # Get credentials from config or environment
-        creds = get_store_credentials(store_id)
-        if not creds:
-            return None
-        access_token = creds["access_token"]
-        base_url = creds["base_url"]
-        api_version = creds["api_version"]
-
-    if not access_token or not base_url:
-        return None
+    cached = _CREDENTIALS_CACHE.get(store_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    credentials = get_store_credentials(store_id)
+    if credentials:
+        with _CREDENTIALS_LOCK:
+            _CREDENTIALS_CACHE[store_id] = (time.monotonic() + CREDENTIALS_CACHE_TTL, credentials)
+    return credentials
 
-    try:
-        # Initialize the Shopify session
-        session = shopify.Session(base_url, api_version, access_token)
-        shopify.ShopifyResource.activate_session(session)
-
-        return shopify
-
-    except KeyError as e:
-        print(f"Error: {e}")
+def _resolve_credentials(store_id: str = None) -> dict | None:
+    """
+    Cached store credentials, or None (logged) when the store is not configured
+    or lacks an access token or store name.
+    """
+    credentials = get_cached_store_credentials(store_id)
+    if not credentials or not credentials.get("access_token") or not credentials.get("base_url"):
+        logger.error("Failed to establish Shopify connection for store_id: %s", store_id)
         return None
+    return credentials
+
+async def _resolve_credentials_async(store_id: str = None) -> dict | None:
+    """_resolve_credentials for coroutines: the lookup may drive its own event loop, so it runs off this one."""
+    return await asyncio.to_thread(_resolve_credentials, store_id)
 
 def shopify_query_graph(query: str=None, operation_name: str=None, variables: dict|None = None, store_id: str = None) -> dict:
     """
@@ -103,157 +325,858 @@ def shopify_query_graph(query: str=None, operation_name: str=None, variables: di
 
         :return: dict: The response from the Shopify API.
     """
+    res = _execute_graph(query=query, operation_name=operation_name, variables=variables, store_id=store_id)
+    if "error" in res:
+        return res
+
+    return _parse_graph_response(res, operation_name)
+
+def _execute_graph(query: str=None, operation_name: str=None, variables: dict|None = None, store_id: str = None) -> dict:
+    """
+        Send a GraphQL request and return the decoded response body as-is.
+        :return: dict: The raw response ("data", "errors", "extensions"), or {"error": ...}
+            when the request could not be made.
+    """
     if not query and not operation_name:
         return{"error": "Missing parameters"}
     
-    shopify_session = shopify_connection(store_id=store_id)
+    credentials = _resolve_credentials(store_id)
     
-    if shopify_session is None:
-        print("ERROR: Failed to establish Shopify connection")
-        print(f"DEBUG: store_id: {store_id}")
+    if not credentials:
         return {"error": "Failed to establish Shopify connection. Check store configuration."}
     
     if query is None and operation_name:
-        gql_query_path = Path(f"{operation_name}.graphql")
-        if gql_query_path.exists():
-            gql_query_doc = gql_query_path.read_text()
-            response = shopify_session.GraphQL().execute(
-                query=gql_query_doc,
-                variables=variables,
-                operation_name=operation_name,
-            )
-        else:
+        try:
+            query = _load_gql(operation_name)
+        except FileNotFoundError:
             return {"error": f"GraphQL file '{operation_name}.graphql' not found."}
-    elif query:
-        response = shopify_session.GraphQL().execute(
-            query=query,
-            variables=variables,
-            operation_name=operation_name
+
+    scope = credentials["base_url"]
+    for attempt in range(THROTTLE_RETRIES + 1):
+        delay = _THROTTLE.reserve(scope, operation_name)
+        if delay:
+            time.sleep(delay)
+
+        response = _HTTP_SESSION.post(
+            _graphql_url(credentials),
+            json={"query": query, "variables": variables, "operationName": operation_name},
+            headers=_graphql_headers(credentials),
         )
-    else:
-        return {"error": "No query or operation_name provided."}
 
-    res = json.loads(response)
+        try:
+            res = json.loads(response.content)
+        except ValueError:
+            return {"error": f"Invalid response from Shopify (HTTP {response.status_code})"}
+
+        _THROTTLE.update(scope, operation_name, res.get("extensions"))
+        if not _is_throttled(res) or attempt == THROTTLE_RETRIES:
+            return res
+        time.sleep(_THROTTLE.retry_delay(scope, operation_name))
+
+def shopify_batch_execute(operations: list[tuple[str, str, dict]], store_id: str = None) -> list[dict]:
+    """
+        Execute many single-field mutations in as few HTTP requests as possible.
+        Each operation is rewritten under its own alias (a0_, a1_, ...) with its
+        variables renamed to match, and up to MUTATION_BATCH_SIZE of them are sent
+        as one GraphQL document.
+        :param operations: List of (operation_name, mutation document, variables) tuples,
+            as returned by activate_inventory_operation / sale_channels_operation.
+        :param store_id: str: The store ID from config to use for the connection.
+
+        :return: list[dict]: One result per operation, in input order, shaped like
+            the shopify_query_graph result of running that operation on its own.
+    """
+    results = []
+
+    for batch_idx in range(0, len(operations), MUTATION_BATCH_SIZE):
+        batch = operations[batch_idx:batch_idx + MUTATION_BATCH_SIZE]
+
+        definitions = []
+        selections = []
+        batch_variables = {}
+        root_fields = []
+
+        for op_idx, (operation_name, gql_query, variables) in enumerate(batch):
+            alias = f"a{op_idx}"
+            match = _MUTATION_DOCUMENT.match(gql_query)
+            if not match:
+                raise ValueError(f"Cannot batch operation '{operation_name}': not a single mutation document")
+
+            def _rename(text: str) -> str:
+                return _VARIABLE_TOKEN.sub(lambda m: f"${alias}_{m.group(1)}", text)
+
+            body = match.group("body").strip()
+            root_fields.append(_ROOT_FIELD.match(body).group(1))
+            if match.group("definitions"):
+                definitions.append(_rename(match.group("definitions")))
+            selections.append(f"{alias}: {_rename(body)}")
+            batch_variables.update({f"{alias}_{name}": value for name, value in (variables or {}).items()})
+
+        document = "mutation BatchedMutations"
+        if definitions:
+            document += f"({', '.join(definitions)})"
+        document += " {\n" + "\n".join(selections) + "\n}"
+
+        logger.debug("Sending %d batched mutation(s)", len(batch))
+        res = _execute_graph(query=document, operation_name="BatchedMutations", variables=batch_variables, store_id=store_id)
+
+        if "error" in res:
+            results.extend({"error": res["error"]} for _ in batch)
+            continue
+
+        # Errors raised while resolving one alias carry it as the first path
+        # element; any other error concerns the whole document. HTTP-level
+        # failures (e.g. a bad access token) report errors as a plain string.
+        errors = res.get("errors") or []
+        if not isinstance(errors, list):
+            results.extend({"errors": errors} for _ in batch)
+            continue
+
+        aliases = {f"a{op_idx}" for op_idx in range(len(batch))}
+        alias_errors = {}
+        document_errors = []
+        for error in errors:
+            alias = (error.get("path") or [None])[0] if isinstance(error, dict) else None
+            if alias in aliases:
+                alias_errors.setdefault(alias, []).append(error)
+            else:
+                document_errors.append(error)
+        if document_errors:
+            results.extend({"errors": document_errors + alias_errors.get(f"a{op_idx}", [])} for op_idx in range(len(batch)))
+            continue
+
+        data = res.get("data") or {}
+        for op_idx, root_field in enumerate(root_fields):
+            value = data.get(f"a{op_idx}")
+            if f"a{op_idx}" in alias_errors:
+                results.append({"errors": alias_errors[f"a{op_idx}"]})
+            elif isinstance(value, dict) and value.get("userErrors"):
+                results.append({"errors": value["userErrors"]})
+            else:
+                results.append({root_field: value})
+
+    return results
+
+def _graphql_url(credentials: dict) -> str:
+    """Admin API GraphQL endpoint for the given store credentials."""
+    return f"https://{credentials['base_url']}/admin/api/{credentials['api_version']}/graphql.json"
 
+def _graphql_headers(credentials: dict) -> dict:
+    """Request headers authenticating against the Admin API."""
+    return {"X-Shopify-Access-Token": credentials["access_token"]}
+
+def _parse_graph_response(res: dict, operation_name: str = None) -> dict:
+    """
+        Unwrap a decoded GraphQL response into its data, or an errors dict.
+        :param res: dict: The decoded JSON body returned by Shopify.
+        :param operation_name: str: The name of the GraphQL operation; only mutations
+            listed in _OP_TO_ROOT are checked for userErrors.
+        :return: dict: The "data" payload, or {"errors": [...]} on failure.
+    """
     # Check if the request was successful
     if res.get("errors"):
         return {"errors": res["errors"]}
 
-    for value in res["data"].values():
-        if isinstance(value, dict) and "userErrors" in value and value["userErrors"]:
-            return {"errors": value["userErrors"]}
+    root_field = _OP_TO_ROOT.get(operation_name)
+    if root_field:
+        root = res["data"].get(root_field)
+        if root and root.get("userErrors"):
+            return {"errors": root["userErrors"]}
 
     return res["data"]
 
-def check_product_exists(shopify_session: ShopifyConnection, channel_reference: str, product_reference: str) -> tuple[bool, float]:
+async def shopify_query_graph_async(
+    http_session: aiohttp.ClientSession,
+    credentials: dict,
+    query: str,
+    operation_name: str = None,
+    variables: dict | None = None,
+) -> dict:
+    """
+        Execute a GraphQL query against the Shopify API without blocking the event loop.
+        Many calls can share one aiohttp session and run concurrently with asyncio.gather.
+        :param http_session: aiohttp.ClientSession: The HTTP session to send the request with.
+        :param credentials: dict: Store credentials as returned by get_store_credentials.
+        :param query: str: The GraphQL document.
+        :param operation_name: str: The name of the GraphQL operation.
+        :param variables: dict: The variables for the GraphQL query. Default is None.
+
+        :return: dict: The response from the Shopify API.
+    """
+    payload = {"query": query, "variables": variables, "operationName": operation_name}
+    scope = credentials["base_url"]
+
+    for attempt in range(THROTTLE_RETRIES + 1):
+        delay = _THROTTLE.reserve(scope, operation_name)
+        if delay:
+            await asyncio.sleep(delay)
+
+        async with http_session.post(_graphql_url(credentials), json=payload, headers=_graphql_headers(credentials)) as response:
+            body = await response.read()
+            status = response.status
+
+        try:
+            res = json.loads(body)
+        except ValueError:
+            return {"error": f"Invalid response from Shopify (HTTP {status})"}
+
+        _THROTTLE.update(scope, operation_name, res.get("extensions"))
+        if not _is_throttled(res) or attempt == THROTTLE_RETRIES:
+            break
+        await asyncio.sleep(_THROTTLE.retry_delay(scope, operation_name))
+
+    return _parse_graph_response(res, operation_name)
+
+def _run_loop(coro):
+    """asyncio.run, on a uvloop event loop when uvloop is installed."""
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop if uvloop else None) as runner:
+        return runner.run(coro)
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """The event loop shared by the synchronous entry points, started on first use."""
+    global _LOOP
+
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="shopify-graphql", daemon=True).start()
+            _LOOP = loop
+    return _LOOP
+
+@contextlib.asynccontextmanager
+async def _client_session() -> AsyncIterator[aiohttp.ClientSession]:
+    """
+        The pooled aiohttp session when running on the background loop, so its
+        keep-alive connections carry over between calls; a short-lived session on
+        any other loop (e.g. when an *_async function is awaited by the caller).
+    """
+    global _HTTP_CLIENT
+
+    if asyncio.get_running_loop() is not _LOOP:
+        async with aiohttp.ClientSession() as http_session:
+            yield http_session
+        return
+
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.closed:
+        _HTTP_CLIENT = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE))
+    yield _HTTP_CLIENT
+
+def _close_client_session():
+    """Close the pooled aiohttp session at interpreter exit."""
+    if _HTTP_CLIENT is not None and not _HTTP_CLIENT.closed:
+        asyncio.run_coroutine_threadsafe(_HTTP_CLIENT.close(), _LOOP).result(timeout=5)
+
+atexit.register(_close_client_session)
+
+def _run_sync(coro):
+    """
+        Run a coroutine to completion from synchronous code, on the shared
+        background loop. Also works when the calling thread already runs an
+        event loop (e.g. an async FastAPI endpoint), which is blocked meanwhile.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+
+def strip_gid(gid: str) -> str:
+    """Return the bare numeric id from a Shopify GID (gid://shopify/<Type>/<id>); plain ids pass through."""
+    return gid.rpartition("/")[2]
+
+_GQL_CHECK_PRODUCT_EXISTS = _minify_gql("""#gql
+    query CheckProductExists($query: String!) {
+        products(first: 1, query: $query) {
+            nodes {
+                id
+            }
+        }
+    }
+""")
+
+def check_product_exists(channel_reference: str, product_reference: str, store_id: str = None) -> tuple[bool, float]:
     """
         Check if product exists in Shopify.
-        :param shopify_session: ShopifyConnection: The Shopify API client.
         :param channel_reference: RetrieveProductDb: The product id to check.
-        :param product_reference: str: The product reference (SKU).
+        :param product_reference: str: The product reference (barcode).
+        :param store_id: str: The store ID from config
         :return: bool: True if the product exists, False otherwise.
     """
-    start_time = datetime.now()
-
-    # Logic to check if the product exists in Shopify
-    exists = False  # Placeholder for actual existence check logic
+    start_time = time.perf_counter()
 
     result = shopify_query_graph(
-            shopify_session=shopify_session,
+            query=_GQL_CHECK_PRODUCT_EXISTS,
             operation_name="CheckProductExists",
             variables={
                 "query": f"barcode:{product_reference} AND id:{channel_reference}"
-            }
+            },
+            store_id=store_id
     )
 
-    time_elapsed = (datetime.now() - start_time).total_seconds()
-    if result.get("errors"):
-        print(f"Error checking product existence: {result.get('errors')}")
-        return exists, time_elapsed
-
-    if not result.get("data") and result.get("data").get("products"):
-        exists = False
+    time_elapsed = time.perf_counter() - start_time
+    if result.get("error") or result.get("errors"):
+        logger.error("Error checking product existence: %s", result.get("error") or result.get("errors"))
+        return False, time_elapsed
 
-    exists = True
+    exists = bool(result.get("products", {}).get("nodes"))
     return exists, time_elapsed
 
-def get_product_variants_by_sku(sku_list: list, store_id: str = None) -> list[dict]:
-    gql_query="""#gql
-        query GetProductVariantBySku($query: String!, $after: String) {
-            productVariants(first: 250, query: $query, after: $after) {
-                nodes {
+_GQL_CHECK_PRODUCTS_EXIST = _minify_gql("""#gql
+    query CheckProductsExist($query: String!, $after: String) {
+        productVariants(first: 250, query: $query, after: $after) {
+            nodes {
+                barcode
+                product {
                     id
-                    title
-                    sku
-                    barcode
-                    product{
-                        id
-                    }
-                    inventoryItem {
-                        id
-                    }
-                }
-                pageInfo {
-                    hasNextPage
-                    endCursor
                 }
             }
+            pageInfo {
+                hasNextPage
+                endCursor
+            }
         }
-    """
-    # Shopify search queries have a complexity/length limit, so batch the input list
-    QUERY_BATCH_SIZE = 100
-    all_variants = []
-    total_batches = (len(sku_list) + QUERY_BATCH_SIZE - 1) // QUERY_BATCH_SIZE
+    }
+""")
 
-    for batch_idx in range(0, len(sku_list), QUERY_BATCH_SIZE):
-        batch = sku_list[batch_idx:batch_idx + QUERY_BATCH_SIZE]
-        batch_num = (batch_idx // QUERY_BATCH_SIZE) + 1
-        print(f"DEBUG: SKU query batch {batch_num}/{total_batches} ({len(batch)} SKUs)")
+def check_products_exist(pairs: list[tuple[str, str]], store_id: str = None) -> dict[str, bool] | None:
+    """
+        Bulk version of check_product_exists: one paginated search per batch of
+        pairs instead of one request per product.
+        :param pairs: List of (channel_reference, product_reference) tuples, i.e.
+            (product id, barcode) as passed to check_product_exists.
+        :param store_id: str: The store ID from config
+        :return: dict: {barcode: True/False} for every requested barcode, or None on error.
+    """
+    # Each pair is an AND of two search terms, so it counts as two clauses
+    QUERY_BATCH_SIZE = _MAX_CLAUSES_PER_QUERY // 2
+    found = set()
 
-        if len(batch) == 1:
-            query_str = f'sku:"{batch[0].strip()}"'
-        else:
-            query_str = " OR ".join([f'sku:"{s.strip()}"' for s in batch])
+    for batch_idx in range(0, len(pairs), QUERY_BATCH_SIZE):
+        batch = pairs[batch_idx:batch_idx + QUERY_BATCH_SIZE]
+        query_str = " OR ".join(
+            f'(barcode:"{product_reference}" AND product_id:{strip_gid(str(channel_reference))})'
+            for channel_reference, product_reference in batch
+        )
 
         has_next_page = True
-        cursor = None
+        gql_variables = {"query": query_str, "after": None}
 
         while has_next_page:
-            gql_variables = {
-                "query": query_str,
-                "after": cursor
-            }
-            
             result = shopify_query_graph(
-                    query=gql_query,
-                    operation_name="GetProductVariantBySku",
+                    query=_GQL_CHECK_PRODUCTS_EXIST,
+                    operation_name="CheckProductsExist",
                     variables=gql_variables,
                     store_id=store_id
             )
-            
-            if "error" in result:
-                print(f"ERROR in get_product_variants_by_sku: {result['error']}")
+
+            if result.get("error") or result.get("errors"):
+                logger.error("Error checking product existence: %s", result.get("error") or result.get("errors"))
                 return None
-            
+
+            variants = result.get("productVariants", {})
+            for variant in variants.get("nodes", []):
+                product_id = (variant.get("product") or {}).get("id", "")
+                found.add((variant.get("barcode"), strip_gid(product_id)))
+
+            page_info = variants.get("pageInfo", {})
+            has_next_page = page_info.get("hasNextPage", False)
+            gql_variables["after"] = page_info.get("endCursor")
+
+    return {
+        product_reference: (product_reference, strip_gid(str(channel_reference))) in found
+        for channel_reference, product_reference in pairs
+    }
+
+# Marks the end of a stream of variant pages handed between tasks or threads
+_END_OF_PAGES = object()
+
+# Selection for each variant field the productVariants searches can return.
+# Scalars are free, but every object field costs a point per node in Shopify's
+# query cost, and all of them add to the payload size
+VARIANT_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "sku": "sku",
+    "barcode": "barcode",
+    "product": "product { id }",
+    "inventoryItem": "inventoryItem { id }",
+}
+
+def _variant_fields(identifier_field: str, fields: set[str] | None) -> frozenset[str]:
+    """Fields to select: all of them by default, otherwise the requested ones plus the identifier."""
+    if fields is None:
+        return frozenset(VARIANT_FIELDS)
+    unknown = set(fields) - VARIANT_FIELDS.keys()
+    if unknown:
+        raise ValueError(f"Unknown variant fields: {sorted(unknown)}")
+    return frozenset(fields) | {identifier_field}
+
+def _variant_selection(fields: frozenset[str], indent: int) -> str:
+    """The selection lines of `fields`, indented for embedding in a search document."""
+    return "\n".join(
+        f"{' ' * indent}{selection}" for name, selection in VARIANT_FIELDS.items() if name in fields
+    )
+
+@functools.lru_cache(maxsize=32)
+def _variant_search_query(operation_name: str, fields: frozenset[str]) -> str:
+    """Build (once per field set) the productVariants search document selecting `fields`."""
+    return _minify_gql(f"""#gql
+        query {operation_name}($query: String!, $after: String) {{
+            productVariants(first: 250, query: $query, after: $after) {{
+                nodes {{
+{_variant_selection(fields, 20)}
+                }}
+                pageInfo {{
+                    hasNextPage
+                    endCursor
+                }}
+            }}
+        }}
+    """)
+
+@functools.lru_cache(maxsize=32)
+def _multi_variant_search_query(operation_name: str, fields: frozenset[str], count: int) -> str:
+    """
+        Build (once per field set and size) a document running `count` productVariants
+        searches under the aliases r0, r1, ..., with the search strings in $q0, $q1, ...
+        All searches share the page size $first, which keeps the summed cost of one
+        request at that of a single 250-node page.
+    """
+    definitions = ", ".join(f"$q{idx}: String!" for idx in range(count))
+    searches = "\n".join(
+        f"            r{idx}: productVariants(first: $first, query: $q{idx}) {{ ...VariantPage }}"
+        for idx in range(count)
+    )
+    return _minify_gql(f"""#gql
+        query {operation_name}($first: Int!, {definitions}) {{
+{searches}
+        }}
+
+        fragment VariantPage on ProductVariantConnection {{
+            nodes {{
+{_variant_selection(fields, 16)}
+            }}
+            pageInfo {{
+                hasNextPage
+                endCursor
+            }}
+        }}
+    """)
+
+async def _iter_variant_pages_async(
+    http_session: aiohttp.ClientSession,
+    credentials: dict,
+    gql_query: str,
+    operation_name: str,
+    query_str: str,
+    cursor: str = None,
+) -> AsyncIterator[list[dict]]:
+    """
+        Walk the result pages of a productVariants search, yielding each page's nodes.
+        :param cursor: Resume the search after this cursor instead of from the start
+        :raises RuntimeError: if Shopify returned an error.
+    """
+    has_next_page = True
+    # One variables dict for the whole walk; only the cursor changes per page
+    gql_variables = {
+        "query": query_str,
+        "after": cursor
+    }
+
+    while has_next_page:
+        result = await shopify_query_graph_async(
+                http_session,
+                credentials,
+                query=gql_query,
+                operation_name=operation_name,
+                variables=gql_variables,
+        )
+
+        if "error" in result:
+            raise RuntimeError(f"ERROR in {operation_name}: {result['error']}")
+
+        if "errors" in result:
+            raise RuntimeError(f"ERROR in {operation_name}: {result['errors']}")
+
+        if result and "productVariants" in result:
+            variants = result["productVariants"]["nodes"]
+
+            page_info = result["productVariants"]["pageInfo"]
+            has_next_page = page_info.get("hasNextPage", False)
+            gql_variables["after"] = page_info.get("endCursor")
+
+            logger.debug("Fetched %d variants", len(variants))
+            yield variants
+        else:
+            break
+
+def _search_queries(identifier_field: str, identifiers: list) -> Iterator[str]:
+    """
+        Yield OR-joined search strings covering `identifiers`, each with at most
+        _MAX_CLAUSES_PER_QUERY clauses and at most _MAX_QUERY_LENGTH characters.
+    """
+    clauses = []
+    length = 0
+    for identifier in identifiers:
+        clause = f'{identifier_field}:"{identifier.strip()}"'
+        if clauses and (len(clauses) == _MAX_CLAUSES_PER_QUERY or length + 4 + len(clause) > _MAX_QUERY_LENGTH):
+            yield " OR ".join(clauses)
+            clauses = []
+            length = 0
+        length += len(clause) + (4 if clauses else 0)
+        clauses.append(clause)
+    if clauses:
+        yield " OR ".join(clauses)
+
+class _BulkUnavailable(Exception):
+    """Shopify did not start the bulk operation; the paginated search is used instead."""
+
+_GQL_BULK_VARIANTS_RUN = _minify_gql("""#gql
+    mutation BulkVariantsRun($query: String!) {
+        bulkOperationRunQuery(query: $query) {
+            bulkOperation {
+                id
+                status
+            }
+            userErrors {
+                field
+                message
+            }
+        }
+    }
+""")
+
+_GQL_CURRENT_BULK_OPERATION = _minify_gql("""#gql
+    query CurrentBulkOperation {
+        currentBulkOperation {
+            id
+            status
+            errorCode
+            objectCount
+            url
+        }
+    }
+""")
+
+async def _aiter_product_variants_bulk(
+    http_session: aiohttp.ClientSession,
+    credentials: dict,
+    identifier_field: str,
+    identifier_list: list,
+    fields: frozenset[str],
+) -> AsyncIterator[list[dict]]:
+    """
+        Export every product variant with a bulk operation and stream the NDJSON
+        result, yielding pages of up to 250 variants whose identifier is in the list.
+        :raises _BulkUnavailable: if Shopify refused to start the operation (e.g.
+            another bulk query is still running) or another bulk operation replaced
+            it, before anything was yielded.
+        :raises RuntimeError: if the bulk operation failed.
+    """
+    bulk_query = f"{{ productVariants {{ edges {{ node {{ {' '.join(VARIANT_FIELDS[name] for name in VARIANT_FIELDS if name in fields)} }} }} }} }}"
+    result = await shopify_query_graph_async(
+            http_session,
+            credentials,
+            query=_GQL_BULK_VARIANTS_RUN,
+            operation_name="BulkVariantsRun",
+            variables={"query": bulk_query},
+    )
+    if "error" in result or "errors" in result:
+        logger.warning("Bulk variant export not started, using paginated search: %s", result.get("error") or result.get("errors"))
+        raise _BulkUnavailable
+    operation_id = result["bulkOperationRunQuery"]["bulkOperation"]["id"]
+    logger.debug("Started bulk variant export %s", operation_id)
+
+    while True:
+        await asyncio.sleep(BULK_POLL_INTERVAL)
+        result = await shopify_query_graph_async(
+                http_session,
+                credentials,
+                query=_GQL_CURRENT_BULK_OPERATION,
+                operation_name="CurrentBulkOperation",
+        )
+        if "error" in result or "errors" in result:
+            raise RuntimeError(f"ERROR in CurrentBulkOperation: {result.get('error') or result.get('errors')}")
+
+        operation = result.get("currentBulkOperation") or {}
+        if operation.get("id") != operation_id:
+            logger.warning("Bulk variant export %s was replaced by another bulk operation, using paginated search", operation_id)
+            raise _BulkUnavailable
+        if operation["status"] == "COMPLETED":
+            break
+        if operation["status"] in ("FAILED", "CANCELED", "EXPIRED"):
+            raise RuntimeError(f"Bulk variant export {operation['status']}: {operation.get('errorCode')}")
+
+    logger.debug("Bulk variant export finished with %s objects", operation.get("objectCount"))
+    if not operation.get("url"):
+        return  # The shop has no variants
+
+    wanted = set(identifier_list)
+    page = []
+    async with http_session.get(operation["url"]) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            if not line.strip():
+                continue
+            node = json.loads(line)
+            if node.get(identifier_field) in wanted:
+                page.append(node)
+                if len(page) == 250:
+                    yield page
+                    page = []
+    if page:
+        yield page
+
+async def _aiter_product_variants(
+    identifier_field: str,
+    identifier_list: list,
+    fields: frozenset[str],
+    operation_name: str,
+    store_id: str = None,
+) -> AsyncIterator[list[dict]]:
+    """
+        Search product variants by SKU or barcode, running the identifier batches concurrently.
+        The identifiers are split into OR-joined search queries, and up to VARIANT_SEARCHES_PER_REQUEST
+        of them are sent as aliased searches in one GraphQL document. A search whose
+        matches do not fit its first page continues on its own by cursor.
+        Pages are yielded as soon as any request receives them; at most a couple of
+        pages per concurrent request are held in memory at a time.
+        Lists longer than BULK_QUERY_THRESHOLD are matched against a bulk export
+        instead, unless Shopify refuses to start one.
+        :param identifier_field: The search field, "sku" or "barcode"
+        :param identifier_list: List of identifiers to search for
+        :param fields: Variant fields to select, as returned by _variant_fields
+        :param operation_name: The name of the GraphQL operation
+        :param store_id: The store ID from config
+        :raises RuntimeError: if the store is not configured or Shopify returned an error.
+    """
+    # Repeated identifiers would only inflate the search strings and their cost
+    identifier_list = _unique_identifiers(identifier_list, identifier_field)
+    if not identifier_list:
+        return
+
+    query_strs = list(_search_queries(identifier_field, identifier_list))
+    total_requests = (len(query_strs) + VARIANT_SEARCHES_PER_REQUEST - 1) // VARIANT_SEARCHES_PER_REQUEST
+
+    credentials = await _resolve_credentials_async(store_id)
+    if not credentials:
+        raise RuntimeError(f"Failed to establish Shopify connection for store_id: {store_id}")
+
+    gql_query = _variant_search_query(operation_name, fields)
+    semaphore = asyncio.Semaphore(GRAPHQL_CONCURRENCY)
+    pages = asyncio.Queue(maxsize=GRAPHQL_CONCURRENCY * 2)
+
+    async def _run(request_num: int, query_strs: list[str]):
+        multi_query = _multi_variant_search_query(operation_name, fields, len(query_strs))
+        gql_variables = {"first": 250 // len(query_strs)}
+        gql_variables.update({f"q{idx}": query_str for idx, query_str in enumerate(query_strs)})
+
+        async with semaphore:
+            logger.debug("%s query request %d/%d (%d searches)", identifier_field, request_num, total_requests, len(query_strs))
+            result = await shopify_query_graph_async(
+                    http_session,
+                    credentials,
+                    query=multi_query,
+                    operation_name=operation_name,
+                    variables=gql_variables,
+            )
+
+            if "error" in result:
+                raise RuntimeError(f"ERROR in {operation_name}: {result['error']}")
+
             if "errors" in result:
-                print(f"ERROR in get_product_variants_by_sku: {result['errors']}")
-                return None
-                
-            if result and "productVariants" in result:
-                variants = result["productVariants"]["nodes"]
-                all_variants.extend(variants)
-                
-                page_info = result["productVariants"]["pageInfo"]
-                has_next_page = page_info.get("hasNextPage", False)
-                cursor = page_info.get("endCursor")
-                
-                print(f"DEBUG: Fetched {len(variants)} variants, total so far: {len(all_variants)}")
-            else:
-                break
+                raise RuntimeError(f"ERROR in {operation_name}: {result['errors']}")
+
+            for idx, query_str in enumerate(query_strs):
+                connection = result.get(f"r{idx}")
+                if not connection:
+                    continue
+                logger.debug("Fetched %d variants", len(connection["nodes"]))
+                await pages.put(connection["nodes"])
+
+                page_info = connection["pageInfo"]
+                if page_info.get("hasNextPage"):
+                    async for page in _iter_variant_pages_async(
+                        http_session, credentials, gql_query, operation_name, query_str,
+                        cursor=page_info.get("endCursor"),
+                    ):
+                        await pages.put(page)
+
+    async def _produce():
+        # The task group cancels the remaining requests as soon as one fails
+        try:
+            async with asyncio.TaskGroup() as group:
+                for request_idx in range(0, len(query_strs), VARIANT_SEARCHES_PER_REQUEST):
+                    request_queries = query_strs[request_idx:request_idx + VARIANT_SEARCHES_PER_REQUEST]
+                    group.create_task(_run((request_idx // VARIANT_SEARCHES_PER_REQUEST) + 1, request_queries))
+        except BaseExceptionGroup as errors:
+            await pages.put(errors.exceptions[0])
+        else:
+            await pages.put(_END_OF_PAGES)
+
+    async with _client_session() as http_session:
+        if len(identifier_list) > BULK_QUERY_THRESHOLD:
+            try:
+                async for page in _aiter_product_variants_bulk(
+                    http_session, credentials, identifier_field, identifier_list, fields
+                ):
+                    yield page
+                return
+            except _BulkUnavailable:
+                pass
+
+        producer = asyncio.create_task(_produce())
+        try:
+            while (page := await pages.get()) is not _END_OF_PAGES:
+                if isinstance(page, BaseException):
+                    raise page
+                yield page
+        finally:
+            producer.cancel()
 
-    print(f"DEBUG: Completed SKU query with total {len(all_variants)} variants found")
+async def _get_product_variants_async(
+    identifier_field: str,
+    identifier_list: list,
+    fields: frozenset[str],
+    operation_name: str,
+    store_id: str = None,
+) -> list[dict] | None:
+    """
+        Collect every variant found by _aiter_product_variants.
+        :return: List of product variant nodes, or None on error
+    """
+    all_variants = []
+    try:
+        async for page in _aiter_product_variants(
+            identifier_field, identifier_list, fields, operation_name, store_id=store_id
+        ):
+            all_variants.extend(page)
+    except RuntimeError as e:
+        logger.error("%s", e)
+        return None
+
+    logger.debug("Completed %s query with total %d variants found", identifier_field, len(all_variants))
     return all_variants
 
+def _iter_sync(async_iterable: AsyncIterator) -> Iterator:
+    """
+        Consume an async iterator from synchronous code, one item at a time.
+        The iterator runs on the shared background loop and hands
+        items over through a small bounded queue, so a slow consumer pauses the
+        producer instead of letting items pile up.
+    """
+    items = queue.Queue(maxsize=2)
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def _pump():
+        # _put blocks, so it runs off the loop to keep other work on it going
+        try:
+            async for item in async_iterable:
+                if not await asyncio.to_thread(_put, item):
+                    return
+        except Exception as e:
+            await asyncio.to_thread(_put, e)
+        else:
+            await asyncio.to_thread(_put, _END_OF_PAGES)
+        finally:
+            # Stop the producer tasks right away when the consumer gave up early
+            await async_iterable.aclose()
+
+    pump = asyncio.run_coroutine_threadsafe(_pump(), _background_loop())
+    try:
+        while (item := items.get()) is not _END_OF_PAGES:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        pump.result()
+
+def _unique_identifiers(identifier_list: list, identifier_field: str) -> list[str]:
+    """
+        Drop repeated identifiers, keeping first-seen order, so each one is matched once.
+        :param identifier_list: Raw identifiers as read from the import file
+        :param identifier_field: The search field, used for the debug message
+        :return: List of distinct identifiers
+    """
+    unique = list(dict.fromkeys(str(i).strip() for i in identifier_list))
+    if len(unique) < len(identifier_list):
+        logger.debug("Deduplicated %d %ss to %d unique", len(identifier_list), identifier_field, len(unique))
+    return unique
+
+async def get_product_variants_by_sku_async(sku_list: list, store_id: str = None, fields: set[str] | None = None) -> list[dict]:
+    """
+        Get product variants by SKU, querying the SKU batches concurrently.
+        :param sku_list: List of SKUs to search for
+        :param store_id: The store ID from config
+        :param fields: Variant fields to select (keys of VARIANT_FIELDS); all of them by default
+        :return: List of product variant nodes
+    """
+    variant_fields = _variant_fields("sku", fields)
+    return await _get_product_variants_async(
+        "sku", sku_list, variant_fields, "GetProductVariantBySku", store_id=store_id
+    )
+
+def get_product_variants_by_sku(sku_list: list, store_id: str = None, fields: set[str] | None = None) -> list[dict]:
+    """
+        Synchronous wrapper around get_product_variants_by_sku_async.
+        :param sku_list: List of SKUs to search for
+        :param store_id: The store ID from config
+        :param fields: Variant fields to select (keys of VARIANT_FIELDS); all of them by default
+        :return: List of product variant nodes
+    """
+    return _run_sync(get_product_variants_by_sku_async(sku_list, store_id=store_id, fields=fields))
+
+def iter_product_variants_by_sku(sku_list: list, store_id: str = None, fields: set[str] | None = None) -> Iterator[list[dict]]:
+    """
+        Stream product variants by SKU one result page (up to 250 nodes) at a time,
+        so callers can process and discard pages instead of holding every variant.
+        :param sku_list: List of SKUs to search for
+        :param store_id: The store ID from config
+        :param fields: Variant fields to select (keys of VARIANT_FIELDS); all of them by default
+        :raises RuntimeError: if the store is not configured or Shopify returned an error.
+    """
+    variant_fields = _variant_fields("sku", fields)
+    return _iter_sync(_aiter_product_variants(
+        "sku", sku_list, variant_fields, "GetProductVariantBySku", store_id=store_id
+    ))
+
+# Translation table deleting ASCII digits, used to test "all digits" in bulk
+_DIGIT_STRIP = str.maketrans("", "", "0123456789")
+
+# Values the file readers put in place of a missing identifier
+_PLACEHOLDER_IDENTIFIERS = ["EMPTY_SKU", "nan", "None"]
+
+# Identifier count from which the Numba kernel (when numba is installed) is
+# used; below it the NumPy passes finish before the kernel pays off
+NUMBA_MIN_IDENTIFIERS = 5000
+
+if njit is not None:
+    @njit(cache=True, parallel=True)
+    def _classify_digits(codes: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """
+        Classify the first `lengths[i]` code points of each row of `codes`:
+        1 if all are ASCII digits, 0 if any is another ASCII character (or the
+        row is empty), 2 if the rest are non-ASCII and str.isdigit must decide.
+        """
+        kinds = np.zeros(lengths.shape[0], dtype=np.int8)
+        for i in prange(lengths.shape[0]):
+            kind = 1 if lengths[i] > 0 else 0
+            for j in range(lengths[i]):
+                code = codes[i, j]
+                if code > 127:
+                    kind = 2
+                elif code < 48 or code > 57:
+                    kind = 0
+                    break
+            kinds[i] = kind
+        return kinds
+
 def detect_identifier_type(identifiers: list) -> str:
     """
     Detect whether a list of identifiers are SKUs or barcodes.
@@ -264,28 +1187,52 @@ def detect_identifier_type(identifiers: list) -> str:
     if not identifiers:
         return "sku"  # Default to SKU if empty list
     
-    # Filter out empty/invalid identifiers for detection
-    valid_identifiers = [str(i) for i in identifiers if i and str(i) not in ["EMPTY_SKU", "nan", "None"]]
+    # Fast path: when every identifier consists of ASCII digits only, one
+    # C-level translate over the concatenation proves it without a Python loop
+    joined = "".join(map(str, identifiers))
+    if joined and not joined.translate(_DIGIT_STRIP):
+        return "barcode"
     
-    if not valid_identifiers:
+    # Classify all identifiers with a few vectorized passes over one string
+    # array instead of a Python-level loop; placeholder values do not count
+    values = np.asarray(identifiers, dtype=str)
+    valid = (values != "") & ~np.isin(values, _PLACEHOLDER_IDENTIFIERS)
+    valid_count = np.count_nonzero(valid)
+    
+    if not valid_count:
         return "sku"  # No valid identifiers, default to SKU
     
-    # Count how many are purely numeric
-    numeric_count = sum(1 for identifier in valid_identifiers if identifier.isdigit())
+    if njit is not None and len(values) >= NUMBA_MIN_IDENTIFIERS:
+        # View the fixed-width string array as rows of code points for the kernel;
+        # the rare rows with non-ASCII characters go through str.isdigit like
+        # the NumPy path, so both count the same Unicode digits
+        valid_values = values[valid]
+        codes = valid_values.view(np.uint32).reshape(valid_count, -1)
+        kinds = _classify_digits(codes, np.char.str_len(valid_values))
+        numeric_count = np.count_nonzero(kinds == 1) + np.count_nonzero(np.char.isdigit(valid_values[kinds == 2]))
+    else:
+        numeric_count = np.count_nonzero(np.char.isdigit(values) & valid)
     
     # If more than 80% are numeric, treat as barcodes
-    if numeric_count / len(valid_identifiers) > 0.8:
+    if numeric_count / valid_count > 0.8:
         return "barcode"
     else:
         return "sku"
 
-def get_product_variants_by_identifier(identifier_list: list, identifier_type: str = "auto", store_id: str = None) -> list[dict]:
+def get_product_variants_by_identifier(
+    identifier_list: list,
+    identifier_type: str = "auto",
+    store_id: str = None,
+    fields: set[str] | None = None,
+) -> list[dict]:
     """
     Get product variants by SKU or barcode with automatic detection or explicit type.
     
     :param identifier_list: List of SKUs or barcodes to search for
     :param identifier_type: Type of identifier - "sku", "barcode", or "auto" for automatic detection
     :param store_id: The store ID from config
+    :param fields: Variant fields to select (keys of VARIANT_FIELDS); all of them by default.
+        The identifier field itself is always selected.
     :return: List of product variant nodes
     """
     if not identifier_list:
@@ -294,125 +1241,82 @@ def get_product_variants_by_identifier(identifier_list: list, identifier_type: s
     # Auto-detect identifier type if not specified
     if identifier_type == "auto":
         identifier_type = detect_identifier_type(identifier_list)
-        print(f"DEBUG: Auto-detected identifier type: {identifier_type}")
+        logger.debug("Auto-detected identifier type: %s", identifier_type)
     
-    print(f"DEBUG: Searching for {len(identifier_list)} {identifier_type}s")
+    logger.debug("Searching for %d %ss", len(identifier_list), identifier_type)
     
     # Use the appropriate function based on identifier type
     if identifier_type == "barcode":
-        return get_product_variants_by_barcode(identifier_list, store_id=store_id)
+        return get_product_variants_by_barcode(identifier_list, store_id=store_id, fields=fields)
     elif identifier_type == "sku":
-        return get_product_variants_by_sku(identifier_list, store_id=store_id)
+        return get_product_variants_by_sku(identifier_list, store_id=store_id, fields=fields)
     else:
         raise ValueError(f"Invalid identifier_type: {identifier_type}. Must be 'sku', 'barcode', or 'auto'")
 
-def get_product_variants_by_barcode(barcode_list: list, store_id: str = None) -> list[dict]:
+async def get_product_variants_by_barcode_async(barcode_list: list, store_id: str = None, fields: set[str] | None = None) -> list[dict]:
     """ 
         Get product variants by barcode with pagination support.
-        Shopify limits to 250 results per query, so we loop until we get all variants.
+        Shopify limits to 250 results per query, so each barcode batch loops until
+        it has all its variants; the batches themselves run concurrently.
         :param barcode_list: List of barcodes to search for
         :param store_id: The store ID from config
+        :param fields: Variant fields to select (keys of VARIANT_FIELDS); all of them by default
         :return: List of product variant nodes
     """
-    gql_query="""#gql
-        query GetProductVariantByBarcode($query: String!, $after: String) {
-            productVariants(first: 250, query: $query, after: $after) {
-                nodes {
-                    id
-                    title
-                    sku
-                    barcode
-                    product{
-                        id
-                    }
-                    inventoryItem {
-                        id
-                    }
-                }
-                pageInfo {
-                    hasNextPage
-                    endCursor
-                }
-            }
-        }
-    """
-    # Shopify search queries have a complexity/length limit, so batch the input list
-    QUERY_BATCH_SIZE = 100
-    all_variants = []
-    total_batches = (len(barcode_list) + QUERY_BATCH_SIZE - 1) // QUERY_BATCH_SIZE
-
-    for batch_idx in range(0, len(barcode_list), QUERY_BATCH_SIZE):
-        batch = barcode_list[batch_idx:batch_idx + QUERY_BATCH_SIZE]
-        batch_num = (batch_idx // QUERY_BATCH_SIZE) + 1
-        print(f"DEBUG: Barcode query batch {batch_num}/{total_batches} ({len(batch)} barcodes)")
-
-        if len(batch) == 1:
-            query_str = f'barcode:"{batch[0].strip()}"'
-        else:
-            query_str = " OR ".join([f'barcode:"{b.strip()}"' for b in batch])
-
-        has_next_page = True
-        cursor = None
-
-        while has_next_page:
-            gql_variables = {
-                "query": query_str,
-                "after": cursor
-            }
-            
-            result = shopify_query_graph(
-                    query=gql_query,
-                    operation_name="GetProductVariantByBarcode",
-                    variables=gql_variables,
-                    store_id=store_id
-            )
-            
-            if "error" in result:
-                print(f"ERROR in get_product_variants_by_barcode: {result['error']}")
-                return None
-            
-            if "errors" in result:
-                print(f"ERROR in get_product_variants_by_barcode: {result['errors']}")
-                return None
-                
-            if result and "productVariants" in result:
-                variants = result["productVariants"]["nodes"]
-                all_variants.extend(variants)
-                
-                page_info = result["productVariants"]["pageInfo"]
-                has_next_page = page_info.get("hasNextPage", False)
-                cursor = page_info.get("endCursor")
-                
-                print(f"DEBUG: Fetched {len(variants)} variants, total so far: {len(all_variants)}")
-            else:
-                break
-    print(f"DEBUG: Completed barcode query with total {len(all_variants)} variants found")
-    return all_variants
+    variant_fields = _variant_fields("barcode", fields)
+    return await _get_product_variants_async(
+        "barcode", barcode_list, variant_fields, "GetProductVariantByBarcode", store_id=store_id
+    )
 
-def set_activate_quantity_on_location(inventoryItemId: str, locationId: str, store_id: str = None):
+def iter_product_variants_by_barcode(barcode_list: list, store_id: str = None, fields: set[str] | None = None) -> Iterator[list[dict]]:
     """
-        https://shopify.dev/docs/api/admin-graphql/latest/mutations/inventoryActivate
-    """    
+        Stream product variants by barcode one result page (up to 250 nodes) at a time,
+        so callers can process and discard pages instead of holding every variant.
+        :param barcode_list: List of barcodes to search for
+        :param store_id: The store ID from config
+        :param fields: Variant fields to select (keys of VARIANT_FIELDS); all of them by default
+        :raises RuntimeError: if the store is not configured or Shopify returned an error.
+    """
+    variant_fields = _variant_fields("barcode", fields)
+    return _iter_sync(_aiter_product_variants(
+        "barcode", barcode_list, variant_fields, "GetProductVariantByBarcode", store_id=store_id
+    ))
 
+def get_product_variants_by_barcode(barcode_list: list, store_id: str = None, fields: set[str] | None = None) -> list[dict]:
+    """
+        Synchronous wrapper around get_product_variants_by_barcode_async.
+        :param barcode_list: List of barcodes to search for
+        :param store_id: The store ID from config
+        :param fields: Variant fields to select (keys of VARIANT_FIELDS); all of them by default
+        :return: List of product variant nodes
+    """
+    return _run_sync(get_product_variants_by_barcode_async(barcode_list, store_id=store_id, fields=fields))
 
-    gql_query = """#gql
-        mutation ActivateInventoryItem($inventoryItemId: ID!, $locationId: ID!, $available: Int) {
-            inventoryActivate(inventoryItemId: $inventoryItemId, locationId: $locationId, available: $available) {
-                inventoryLevel {
+_GQL_ACTIVATE_INVENTORY_ITEM = _minify_gql("""#gql
+    mutation ActivateInventoryItem($inventoryItemId: ID!, $locationId: ID!, $available: Int) {
+        inventoryActivate(inventoryItemId: $inventoryItemId, locationId: $locationId, available: $available) {
+            inventoryLevel {
+                id
+                quantities(names: ["available", "on_hand"]) {
+                    name
+                    quantity
+                }
+                item {
+                    id
+                }
+                location {
                     id
-                    quantities(names: ["available", "on_hand"]) {
-                        name
-                        quantity
-                    }
-                    item {
-                        id
-                    }
-                    location {
-                        id
-                    }
                 }
             }
         }
+    }
+""")
+
+def activate_inventory_operation(inventoryItemId: str, locationId: str) -> tuple[str, str, dict]:
+    """
+        Build the ActivateInventoryItem mutation for shopify_query_graph or shopify_batch_execute.
+        https://shopify.dev/docs/api/admin-graphql/latest/mutations/inventoryActivate
+        :return: (operation_name, query, variables)
     """
     
     gql_variables = {
@@ -420,142 +1324,241 @@ def set_activate_quantity_on_location(inventoryItemId: str, locationId: str, sto
        "locationId": locationId,
     #    "available": 0  # Set to 0 to activate without changing quantity
     }
+
+    return "ActivateInventoryItem", _GQL_ACTIVATE_INVENTORY_ITEM, gql_variables
+
+def set_activate_quantity_on_location(inventoryItemId: str, locationId: str, store_id: str = None):
+    """
+        https://shopify.dev/docs/api/admin-graphql/latest/mutations/inventoryActivate
+    """    
+    operation_name, gql_query, gql_variables = activate_inventory_operation(inventoryItemId, locationId)
     
     result = shopify_query_graph(
             query=gql_query,
-            operation_name="ActivateInventoryItem",
+            operation_name=operation_name,
             variables=gql_variables,
             store_id=store_id
     )
     
     return result
 
-def adjust_quantity_to_variant(inventories: list[dict], store_id: str = None):
-    """
-        inventories: [{
-            "delta": 2, # quantità
-            "inventoryItemId": "gid://shopify/InventoryItem/56119140876579",
-            "locationId": "gid://shopify/Location/105539928355"
-        }]
-        
-        Shopify limits to 250 inventory changes per mutation, so we batch them.
-    """
-    gql_query="""#gql
-        mutation inventoryAdjustQuantities($input: InventoryAdjustQuantitiesInput!) {
-            inventoryAdjustQuantities(input: $input) {
-                inventoryAdjustmentGroup {
-                    createdAt
-                    reason
-                    referenceDocumentUri
-                    changes(quantityNames: ["available"]) {
+_GQL_INVENTORY_ADJUST_QUANTITIES = _minify_gql("""#gql
+    mutation inventoryAdjustQuantities($input: InventoryAdjustQuantitiesInput!) {
+        inventoryAdjustQuantities(input: $input) {
+            inventoryAdjustmentGroup {
+                createdAt
+                reason
+                referenceDocumentUri
+                changes(quantityNames: ["available"]) {
+                    name
+                    delta
+                    location{
+                        id
                         name
-                        delta
-                        location{
-                            id
-                            name
-                        }
-                        item {
-                           inventoryLevels(first: 50){
-                               nodes{
-                                   location {
-                                       id
-                                       name
-                                   }
-                                   quantities(names: ["available"]){
-                                       name
-                                       quantity
-                                   }
+                    }
+                    item {
+                       inventoryLevels(first: 50){
+                           nodes{
+                               location {
+                                   id
+                                   name
+                               }
+                               quantities(names: ["available"]){
+                                   name
+                                   quantity
                                }
                            }
-                            variant {
-                                availableForSale
-                                displayName
-                                product {
-                                    id
-                                    handle
-                                }
+                       }
+                        variant {
+                            availableForSale
+                            displayName
+                            product {
+                                id
+                                handle
                             }
                         }
                     }
                 }
-                userErrors {
-                    field
-                    message
-                }
+            }
+            userErrors {
+                field
+                message
             }
         }
+    }
+""")
+
+async def _run_inventory_batches_async(
+    gql_query: str,
+    operation_name: str,
+    root_field: str,
+    batch_variables: list[dict],
+    merge: Callable[[dict], None],
+    store_id: str = None,
+    concurrency: int = GRAPHQL_CONCURRENCY,
+) -> dict | None:
+    """
+        Send the batches of one inventory mutation concurrently, at most
+        `concurrency` at a time, and hand each successful result to `merge` in
+        batch order as soon as the batches before it are done. Results are not
+        kept after merging. Once a batch fails, batches that have not been sent
+        yet are skipped; batches already in flight still land on Shopify, so
+        their results are merged too and listed in the error dict.
+        :param gql_query: The mutation document
+        :param operation_name: The name of the GraphQL operation
+        :param root_field: The mutation's root field, checked for userErrors
+        :param batch_variables: The variables of each batch, in order
+        :param merge: Called with the result of each successful batch, in order
+        :param store_id: The store ID from config
+        :param concurrency: Maximum number of batches in flight; 1 sends them in order
+        :return: None when every batch succeeded, or an error dict naming the first failed batch
+            and the 1-based numbers of the batches that were applied (`applied_batches`)
+    """
+    total_batches = len(batch_variables)
+
+    credentials = await _resolve_credentials_async(store_id)
+    if not credentials:
+        return {"error": "Failed to establish Shopify connection. Check store configuration."}
+
+    semaphore = asyncio.Semaphore(concurrency)
+    # Finished batches waiting for an earlier one before they can be merged
+    pending = {}
+    next_batch = 0
+    failure = None
+    applied_batches = []
+
+    def _merge_ready():
+        nonlocal next_batch, failure
+        while next_batch in pending:
+            result = pending.pop(next_batch)
+            next_batch += 1
+            if result is None:
+                # Skipped after an earlier failure
+                continue
+
+            # Check for errors in this batch
+            if "error" in result or "errors" in result:
+                logger.error("Errors in batch %d: %s", next_batch, result.get("error") or result.get("errors"))
+                failure = failure or {"error": f"Failed at batch {next_batch}/{total_batches}", "details": result}
+            elif result.get(root_field) and result[root_field].get("userErrors"):
+                logger.error("User errors in batch %d: %s", next_batch, result[root_field]["userErrors"])
+                failure = failure or {"error": f"User errors in batch {next_batch}/{total_batches}", "details": result}
+            else:
+                merge(result)
+                applied_batches.append(next_batch)
+
+    failed = False
+
+    async def _run(batch_idx: int, variables: dict):
+        nonlocal failed
+        async with semaphore:
+            if failed:
+                pending[batch_idx] = None
+                _merge_ready()
+                return
+            logger.debug("Processing batch %d/%d", batch_idx + 1, total_batches)
+            try:
+                result = await shopify_query_graph_async(
+                        http_session,
+                        credentials,
+                        query=gql_query,
+                        operation_name=operation_name,
+                        variables=variables,
+                )
+            except Exception as e:
+                # Stop the batches not sent yet; Shopify may or may not have
+                # applied this one, so it is reported as failed
+                result = {"error": f"Request failed: {type(e).__name__}: {e}"}
+        if "error" in result or "errors" in result or (result.get(root_field) or {}).get("userErrors"):
+            failed = True
+        pending[batch_idx] = result
+        _merge_ready()
+
+    async with _client_session() as http_session:
+        await asyncio.gather(*(_run(batch_idx, variables) for batch_idx, variables in enumerate(batch_variables)))
+
+    if failure:
+        logger.warning("Batches applied despite the failure: %s", applied_batches)
+        failure["applied_batches"] = applied_batches
+    return failure
+
+def adjust_quantity_to_variant(inventories: list[dict], store_id: str = None):
+    """
+        inventories: [{
+            "delta": 2, # quantità
+            "inventoryItemId": "gid://shopify/InventoryItem/56119140876579",
+            "locationId": "gid://shopify/Location/105539928355"
+        }]
+        
+        Shopify limits to 250 inventory changes per mutation, so we batch them.
     """
     
     # Batch inventories into chunks of 250 (Shopify's limit)
     BATCH_SIZE = 250
-    all_results = []
     total_batches = (len(inventories) + BATCH_SIZE - 1) // BATCH_SIZE
     
-    print(f"DEBUG: Adjusting {len(inventories)} inventories in {total_batches} batch(es)")
+    logger.debug("Adjusting %d inventories in %d batch(es)", len(inventories), total_batches)
     
-    for i in range(0, len(inventories), BATCH_SIZE):
-        batch = inventories[i:i + BATCH_SIZE]
-        batch_num = (i // BATCH_SIZE) + 1
-        
-        print(f"DEBUG: Processing batch {batch_num}/{total_batches} with {len(batch)} items")
-        
-        gql_variables = {
+    batch_variables = [
+        {
             "input": {
                 "reason": "other",
                 "name": "available",
-                "changes": batch
+                "changes": inventories[i:i + BATCH_SIZE]
             }
         }
-        
-        result = shopify_query_graph(
-                query=gql_query,
-                operation_name="inventoryAdjustQuantities",
-                variables=gql_variables,
-                store_id=store_id
-        )
-        
-        # Check for errors in this batch
-        if result and "errors" in result:
-            print(f"ERROR in batch {batch_num}: {result['errors']}")
-            return {"error": f"Failed at batch {batch_num}/{total_batches}", "details": result}
-        
-        if result and "inventoryAdjustQuantities" in result and result["inventoryAdjustQuantities"].get("userErrors"):
-            print(f"USER ERRORS in batch {batch_num}: {result['inventoryAdjustQuantities']['userErrors']}")
-            return {"error": f"User errors in batch {batch_num}/{total_batches}", "details": result}
-        
-        all_results.append(result)
-    
-    # Return the combined results (or just the last one for simplicity)
-    # You could merge all changes if needed
-    print(f"DEBUG: Successfully processed all {total_batches} batch(es)")
-    
-    # Merge all results into one response
-    if all_results:
-        merged_result = {
-            "inventoryAdjustQuantities": {
-                "inventoryAdjustmentGroup": {
-                    "changes": []
+        for i in range(0, len(inventories), BATCH_SIZE)
+    ]
+    
+    if not batch_variables:
+        return None
+    
+    # Merge each batch's changes into one response as the batches complete
+    merged_group = {"changes": []}
+    
+    def _merge(result: dict):
+        group = result["inventoryAdjustQuantities"].get("inventoryAdjustmentGroup") or {}
+        merged_group["changes"].extend(group.get("changes", []))
+        # Keep the metadata of the last batch
+        merged_group.update({
+            "createdAt": group.get("createdAt"),
+            "reason": group.get("reason"),
+            "referenceDocumentUri": group.get("referenceDocumentUri")
+        })
+    
+    # Deltas add up the same in any order, so the batches can be sent concurrently
+    error = _run_sync(_run_inventory_batches_async(
+        _GQL_INVENTORY_ADJUST_QUANTITIES, "inventoryAdjustQuantities", "inventoryAdjustQuantities",
+        batch_variables, _merge, store_id=store_id,
+    ))
+    if error:
+        # Report what did land so the caller can reconcile before retrying
+        error["inventoryAdjustQuantities"] = {"inventoryAdjustmentGroup": merged_group}
+        return error
+    
+    logger.debug("Successfully processed all %d batch(es)", total_batches)
+    
+    return {"inventoryAdjustQuantities": {"inventoryAdjustmentGroup": merged_group}}
+
+_GQL_INVENTORY_SET = _minify_gql("""#gql
+    mutation InventorySet($input: InventorySetQuantitiesInput!) {
+        inventorySetQuantities(input: $input) {
+            inventoryAdjustmentGroup {
+                createdAt
+                reason
+                referenceDocumentUri
+                changes {
+                    name
+                    delta
                 }
             }
+            userErrors {
+                field
+                message
+            }
         }
-        
-        for result in all_results:
-            if result and "inventoryAdjustQuantities" in result:
-                changes = result["inventoryAdjustQuantities"].get("inventoryAdjustmentGroup", {}).get("changes", [])
-                merged_result["inventoryAdjustQuantities"]["inventoryAdjustmentGroup"]["changes"].extend(changes)
-        
-        # Copy metadata from the last result
-        if all_results[-1] and "inventoryAdjustQuantities" in all_results[-1]:
-            last_group = all_results[-1]["inventoryAdjustQuantities"]["inventoryAdjustmentGroup"]
-            merged_result["inventoryAdjustQuantities"]["inventoryAdjustmentGroup"].update({
-                "createdAt": last_group.get("createdAt"),
-                "reason": last_group.get("reason"),
-                "referenceDocumentUri": last_group.get("referenceDocumentUri")
-            })
-        
-        return merged_result
-    
-    return None
+    }
+""")
 
 def set_fixed_quantity_to_variant(inventories: list[dict], store_id: str = None):
     """ 
@@ -576,96 +1579,89 @@ def set_fixed_quantity_to_variant(inventories: list[dict], store_id: str = None)
             }
         }
     """
-    gql_query="""#gql
-        mutation InventorySet($input: InventorySetQuantitiesInput!) {
-            inventorySetQuantities(input: $input) {
-                inventoryAdjustmentGroup {
-                    createdAt
-                    reason
-                    referenceDocumentUri
-                    changes {
-                        name
-                        delta
-                    }
-                }
-                userErrors {
-                    field
-                    message
-                }
-            }
-        }
-    """
     # Batch inventories into chunks of 250 (Shopify's limit)
     BATCH_SIZE = 250
-    all_results = []
     total_batches = (len(inventories) + BATCH_SIZE - 1) // BATCH_SIZE
     
-    for i in range(0, len(inventories), BATCH_SIZE):
-        batch = inventories[i:i + BATCH_SIZE]
-        batch_num = (i // BATCH_SIZE) + 1
-        
-        print(f"DEBUG: Processing batch {batch_num}/{total_batches} with {len(batch)} items")
-        
-        gql_variables = {
+    batch_variables = [
+        {
             "input": {
                 "name": "available",
                 "reason": "correction",
                 "ignoreCompareQuantity": True,
-                "quantities": batch
+                "quantities": inventories[i:i + BATCH_SIZE]
             }
         }
-        
-        result = shopify_query_graph(
-                query=gql_query,
-                operation_name="InventorySet",
-                variables=gql_variables,
-                store_id=store_id
-        )
-        
-        # Check for errors in this batch
-        if result and "errors" in result:
-            print(f"ERROR in batch {batch_num}: {result['errors']}")
-            return {"error": f"Failed at batch {batch_num}/{total_batches}", "details": result}
-        
-        if result and "inventorySetQuantities" in result and result["inventorySetQuantities"].get("userErrors"):
-            print(f"USER ERRORS in batch {batch_num}: {result['inventorySetQuantities']['userErrors']}")
-            return {"error": f"User errors in batch {batch_num}/{total_batches}", "details": result}
-        
-        all_results.append(result)
-    
-    # Return the combined results (or just the last one for simplicity)
-    # You could merge all changes if needed
-    print(f"DEBUG: Successfully processed all {total_batches} batch(es)")
-    
-    # Merge all results into one response
-    if all_results:
-        merged_result = {
-                "changes": [],
-                "createdAt": None,
-                "reason": None,
-                "referenceDocumentUri": None
-            }
-        
-        for result in all_results:
-            if result and "inventorySetQuantities" in result and result["inventorySetQuantities"].get("inventoryAdjustmentGroup") is not None:
-                changes = result["inventorySetQuantities"].get("inventoryAdjustmentGroup", {}).get("changes", [])
-                merged_result["changes"].extend(changes)
-            else:
-                print("DEBUG: No inventoryAdjustmentGroup found in result")
-        
-        # Copy metadata from the last result
-        if all_results[-1] and "inventorySetQuantities" in all_results[-1]:
-            last_group = all_results[-1]["inventorySetQuantities"]["inventoryAdjustmentGroup"]
-            merged_result.update({
-                "createdAt": last_group.get("createdAt"),
-                "reason": last_group.get("reason"),
-                "referenceDocumentUri": last_group.get("referenceDocumentUri")
-            })
-        
-        return merged_result
+        for i in range(0, len(inventories), BATCH_SIZE)
+    ]
     
-    return None
+    if not batch_variables:
+        return None
+    
+    # Merge each batch's changes into one response as the batches complete
+    merged_result = {
+            "changes": [],
+            "createdAt": None,
+            "reason": None,
+            "referenceDocumentUri": None
+        }
+    
+    def _merge(result: dict):
+        group = result["inventorySetQuantities"].get("inventoryAdjustmentGroup")
+        if group is None:
+            logger.debug("No inventoryAdjustmentGroup found in result")
+            return
+        merged_result["changes"].extend(group.get("changes", []))
+        # Keep the metadata of the last batch
+        merged_result.update({
+            "createdAt": group.get("createdAt"),
+            "reason": group.get("reason"),
+            "referenceDocumentUri": group.get("referenceDocumentUri")
+        })
+    
+    # Quantities are absolute: an item/location pair listed twice must be set in
+    # order, so the batches only run concurrently when every pair is distinct
+    pairs = {(q["inventoryItemId"], q["locationId"]) for q in inventories}
+    concurrency = GRAPHQL_CONCURRENCY if len(pairs) == len(inventories) else 1
+    
+    error = _run_sync(_run_inventory_batches_async(
+        _GQL_INVENTORY_SET, "InventorySet", "inventorySetQuantities",
+        batch_variables, _merge, store_id=store_id, concurrency=concurrency,
+    ))
+    if error:
+        # Report what did land so the caller can reconcile before retrying
+        error["changes"] = merged_result["changes"]
+        return error
+    
+    logger.debug("Successfully processed all %d batch(es)", total_batches)
     
+    return merged_result
+    
+_GQL_SET_OBJECT_TO_SALE_CHANNEL = _minify_gql("""#gql
+    mutation SetObjectToSaleChannel($resource_id: ID!, $channels: [PublicationInput!]!) {
+        publishablePublish(id: $resource_id input: $channels) {
+            publishable {
+                resourcePublications(first:10){
+                    nodes{
+                        isPublished
+                    }
+                }
+            }
+            userErrors {
+            field
+            message
+            }
+        }
+    }
+""")
+
+def sale_channels_operation(resource_id: object, channels: list[dict]) -> tuple[str, str, dict]:
+    """
+        Build the SetObjectToSaleChannel mutation for shopify_query_graph or shopify_batch_execute.
+        :return: (operation_name, query, variables)
+    """
+    return "SetObjectToSaleChannel", _GQL_SET_OBJECT_TO_SALE_CHANNEL, {"resource_id": resource_id, "channels": channels}
+
 def add_to_sale_channels(resource_id: object, channels: list[dict], store_id: str = None) -> dict | None:
     """
     Adds products to sale channels in Shopify.
@@ -690,29 +1686,12 @@ def add_to_sale_channels(resource_id: object, channels: list[dict], store_id: st
            ]
         }
     """
-    
-    gql_query = """#gql
-        mutation SetObjectToSaleChannel($resource_id: ID!, $channels: [PublicationInput!]!) {
-            publishablePublish(id: $resource_id input: $channels) {
-                publishable {
-                    resourcePublications(first:10){
-                        nodes{
-                            isPublished
-                        }
-                    }
-                }
-                userErrors {
-                field
-                message
-                }
-            }
-        }
-    """
+    operation_name, gql_query, gql_variables = sale_channels_operation(resource_id, channels)
     res = shopify_query_graph(
         query=gql_query,
-        operation_name="SetObjectToSaleChannel",
-        variables={"resource_id": resource_id, "channels": channels},
+        operation_name=operation_name,
+        variables=gql_variables,
         store_id=store_id
     )
 
-    return res
\ No newline at end of file
+    return res
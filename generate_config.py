@@ -11,31 +11,33 @@ a config_stores.toml file with the configuration for each store.
 
 import os
 import glob
+import mmap
+import re
+import tomli_w
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 
+# One KEY = VALUE assignment per line; surrounding quotes are dropped from the value.
+# Comment and blank lines never match, since a key must start the line
+ENV_ASSIGNMENT = re.compile(
+    rb'^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*'
+    rb'(?:"([^"\r\n]*)"|\'([^\'\r\n]*)\'|([^\r\n]*?))[ \t]*\r?$',
+    re.M,
+)
+
+
 def parse_env_file(filepath):
     """Parse a .env file and return a dictionary of key-value pairs."""
-    config = {}
-    with open(filepath, 'r') as f:
-        for line in f:
-            line = line.strip()
-            # Skip comments and empty lines
-            if not line or line.startswith('#'):
-                continue
-            
-            # Parse KEY = VALUE format
-            if '=' in line:
-                key, value = line.split('=', 1)
-                key = key.strip()
-                value = value.strip()
-                # Remove quotes if present
-                if (value.startswith('"') and value.endswith('"')) or \
-                   (value.startswith("'") and value.endswith("'")):
-                    value = value[1:-1]
-                config[key] = value
-    
-    return config
+    with open(filepath, 'rb') as f:
+        # mmap refuses empty files
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return {
+                match.group(1).decode(): (match.group(2) or match.group(3) or match.group(4) or b'').decode()
+                for match in ENV_ASSIGNMENT.finditer(data)
+            }
 
 
 def get_store_title(store_name):
@@ -63,14 +65,15 @@ def generate_toml_config():
     
     stores_config = {}
     
-    for env_file in env_files:
+    # Parse the env files in parallel; map() keeps them in sorted order
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        configs = list(executor.map(parse_env_file, env_files))
+    
+    for env_file, config in zip(env_files, configs):
         # Extract store identifier from filename (e.g., .env.murphy -> murphy)
         filename = Path(env_file).name
         store_id = filename.replace('.env.', '')
         
-        # Parse the env file
-        config = parse_env_file(env_file)
-        
         if not config.get('STORE_NAME'):
             print(f"Warning: {filename} does not contain STORE_NAME, skipping...")
             continue
@@ -86,20 +89,10 @@ def generate_toml_config():
         stores_config[store_id] = store_config
         print(f"✓ Loaded configuration for: {store_id}")
     
-    # Generate TOML content
-    toml_content = "[stores]\n"
-    
-    for store_id, config in stores_config.items():
-        toml_content += f"\n[stores.{store_id}]\n"
-        toml_content += f'TITLE = "{config["TITLE"]}"\n'
-        toml_content += f'STORE_NAME = "{config["STORE_NAME"]}"\n'
-        toml_content += f"API_VERSION = '{config['API_VERSION']}'\n"
-        toml_content += f'ACCESS_TOKEN = "{config["ACCESS_TOKEN"]}"\n'
-    
-    # Write to config_stores.toml
+    # Write to config_stores.toml; tomli_w quotes and escapes keys and values
     output_file = script_dir / 'config_stores.toml'
-    with open(output_file, 'w') as f:
-        f.write(toml_content)
+    with open(output_file, 'wb') as f:
+        tomli_w.dump({'stores': stores_config}, f)
     
     print(f"\n✅ Successfully generated {output_file}")
     print(f"   Total stores configured: {len(stores_config)}")